@@ -0,0 +1,33 @@
+"""
+Gunicorn configuration for the Piper TTS server
+
+Usage (from this directory):
+    WORKERS=4 gunicorn -c gunicorn.conf.py piper_server:app
+"""
+
+import os
+
+bind = os.environ.get('PIPER_BIND', '127.0.0.1:5050')
+
+# Each worker process runs synthesis in parallel; threads cover cache hits and
+# slow clients while a worker is busy synthesizing
+workers = int(os.environ.get('WORKERS', 2))
+worker_class = 'gthread'
+threads = 4
+timeout = 60
+keepalive = 5
+
+# Up to workers * threads syntheses run at once, so each ONNX Runtime session gets
+# an equal share of the cores (unless ONNX_THREADS is set); workers inherit this
+os.environ.setdefault('ONNX_THREADS', str(max(1, (os.cpu_count() or 1) // (workers * threads))))
+
+# gunicorn sets TCP_NODELAY on its TCP listeners itself; socket send buffers are
+# left to kernel autotuning
+
+# Worker heartbeat files on tmpfs, so a slow disk cannot stall workers
+worker_tmp_dir = '/dev/shm'
+
+# The app is imported in each worker rather than preloaded in the master:
+# ONNX Runtime sessions are not fork-safe (their thread pools do not survive
+# fork), so every worker loads its own voice models on import
+preload_app = False
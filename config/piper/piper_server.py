@@ -2,49 +2,454 @@
 """
 Piper TTS HTTP Server
 A simple Flask server wrapping Piper TTS for NovaPBX
+
+Voices are synthesized in-process with the piper-tts 1.2 API (PiperVoice(config=,
+session=), synthesize_ids_to_raw), which later piper-tts releases removed.
+
+Requires: pip install 'piper-tts>=1.2,<1.3' flask numpy soxr orjson gunicorn
+
+Development: python3 piper_server.py
+Production:  gunicorn -c gunicorn.conf.py piper_server:app
 """
 
-from flask import Flask, request, jsonify, send_file
-import subprocess
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask.json.provider import DefaultJSONProvider
+from collections import OrderedDict
+from functools import lru_cache
+from contextlib import closing
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import threading
 import tempfile
+import hashlib
+import struct
+import json
+import time
 import os
-import io
-import shlex
+import wave
+
+import numpy as np
+import orjson
+import soxr
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
+app.json_provider_class = OrjsonProvider
+app.json = OrjsonProvider(app)
 
 # Configuration
 VOICES_DIR = os.environ.get('VOICES_DIR', '/opt/novapbx/tts-server/voices')
 DEFAULT_VOICE = 'en_US-lessac-medium'
+# Asterisk expects 8kHz mono audio
+OUTPUT_SAMPLE_RATE = 8000
+# Maximum number of voice models kept loaded in memory (least recently used are evicted)
+MAX_LOADED_VOICES = int(os.environ.get('MAX_LOADED_VOICES', 4))
+# Comma-separated voices loaded when the module is imported ('*' for every installed voice,
+# empty to load voices on first request)
+PRELOAD_VOICES = os.environ.get('PRELOAD_VOICES', DEFAULT_VOICE)
+# ONNX Runtime threads per synthesis, kept small so concurrent requests do not oversubscribe the CPU
+# (gunicorn.conf.py sets it to the cores divided by workers * threads)
+ONNX_THREADS = int(os.environ.get('ONNX_THREADS', min(4, os.cpu_count() or 1)))
+# Number of phonemized texts kept in memory (recurring IVR prompts skip espeak-ng)
+PHONEME_CACHE_SIZE = int(os.environ.get('PHONEME_CACHE_SIZE', 4096))
+# Generated audio is cached here, keyed by a hash of voice, speed and text
+CACHE_DIR = os.environ.get('CACHE_DIR', '/opt/novapbx/tts-server/cache')
+# Cache limits: files unused for longer than the max age are deleted, then the least
+# recently used until the cache fits in the max size. Checked at most once per interval.
+CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_MB', 1024)) * 1024 * 1024
+CACHE_MAX_AGE = float(os.environ.get('CACHE_MAX_AGE_DAYS', 7)) * 86400
+CACHE_PRUNE_INTERVAL = 60
+# Temp files of syntheses that were killed mid-write are deleted after this many seconds
+CACHE_TMP_MAX_AGE = 600
+# Streamed audio is written in blocks of at least this many bytes
+STREAM_BLOCK_SIZE = 64 * 1024
+# Seconds a request waits for an identical request's synthesis to finish
+SYNTHESIS_TIMEOUT = 60
+
+# Substrings of voice names used to guess a voice's gender for /voices
+FEMALE_VOICE_NAMES = ('lessac', 'amy', 'kristin', 'kathleen', 'alba', 'cori', 'jenny')
+MALE_VOICE_NAMES = ('ryan', 'joe', 'alan', 'aru', 'kusal', 'arctic')
+
+# Syntheses in progress keyed by cache key, so identical concurrent requests share one synthesis
+INFLIGHT = {}
+INFLIGHT_LOCK = threading.Lock()
+
+# Last time the cache was pruned (time.monotonic())
+_LAST_CACHE_PRUNE = None
+_CACHE_PRUNE_LOCK = threading.Lock()
+
+# Loaded PiperVoice instances keyed by voice name, in LRU order
+VOICES = OrderedDict()
+VOICES_LOCK = threading.Lock()
+# Locks for voices being loaded, keyed by voice name
+VOICE_LOAD_LOCKS = {}
+
+# espeak-ng (used by piper_phonemize) keeps global state, so calls into it are serialized
+PHONEMIZE_LOCK = threading.Lock()
+
+def onnx_session_options():
+    """ONNX Runtime session options tuned for CPU inference"""
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = ONNX_THREADS
+    options.inter_op_num_threads = 1
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.enable_cpu_mem_arena = True
+    return options
+
+def get_voice(voice_name):
+    """Return a loaded PiperVoice, loading the model on first use
+
+    Models are loaded outside VOICES_LOCK, so requests for voices that are already
+    loaded never wait behind a cold load; a per-voice lock keeps concurrent
+    requests for the same new voice from loading it twice.
+    """
+    with VOICES_LOCK:
+        voice = VOICES.get(voice_name)
+        if voice is not None:
+            VOICES.move_to_end(voice_name)
+            return voice
+        load_lock = VOICE_LOAD_LOCKS.setdefault(voice_name, threading.Lock())
+
+    try:
+        with load_lock:
+            with VOICES_LOCK:
+                # Loaded by another request while we waited for the load lock
+                voice = VOICES.get(voice_name)
+                if voice is not None:
+                    VOICES.move_to_end(voice_name)
+                    return voice
+
+            voice = load_voice(voice_name)
+
+            with VOICES_LOCK:
+                VOICES[voice_name] = voice
+                while len(VOICES) > MAX_LOADED_VOICES:
+                    VOICES.popitem(last=False)
+            return voice
+    finally:
+        with VOICES_LOCK:
+            if VOICE_LOAD_LOCKS.get(voice_name) is load_lock:
+                del VOICE_LOAD_LOCKS[voice_name]
+
+def load_voice(voice_name):
+    """Load a PiperVoice from VOICES_DIR on an ONNX Runtime session with tuned options"""
+    import onnxruntime
+    from piper.config import PiperConfig
+    from piper.voice import PiperVoice
+
+    model_path = os.path.join(VOICES_DIR, f'{voice_name}.onnx')
+    json_path = os.path.join(VOICES_DIR, f'{voice_name}.onnx.json')
+
+    # Build the session ourselves (PiperVoice.load uses ONNX Runtime defaults)
+    with open(json_path, 'r', encoding='utf-8') as jf:
+        config = PiperConfig.from_dict(json.load(jf))
+    session = onnxruntime.InferenceSession(
+        model_path,
+        sess_options=onnx_session_options(),
+        providers=['CPUExecutionProvider']
+    )
+    return PiperVoice(config=config, session=session)
+
+def cache_key(voice_name, text, speed=1.0):
+    """Cache key for a synthesis request"""
+    return hashlib.sha256(f'{voice_name}|{speed}|{text}'.encode('utf-8')).hexdigest()
+
+def cache_path(key):
+    """Path of the cached WAV for a cache key"""
+    return os.path.join(CACHE_DIR, f'{key}.wav')
+
+def claim_synthesis(key):
+    """Wait until the audio for key is cached, or claim its synthesis
+
+    Returns None once the audio is cached. Otherwise returns a Future that this
+    request now owns and must resolve with finish_synthesis(); identical requests
+    wait on it meanwhile. If the owner fails, a waiter takes over the synthesis.
+    """
+    while True:
+        with INFLIGHT_LOCK:
+            if touch_cached(cache_path(key)):
+                return None
+            future = INFLIGHT.get(key)
+            if future is None:
+                future = INFLIGHT[key] = Future()
+                return future
+
+        try:
+            future.result(timeout=SYNTHESIS_TIMEOUT)
+        except FutureTimeoutError:
+            raise
+        except Exception:
+            pass
+
+def finish_synthesis(key, future, error=None):
+    """Release a claimed synthesis, waking up the requests waiting on it"""
+    with INFLIGHT_LOCK:
+        if INFLIGHT.get(key) is future:
+            del INFLIGHT[key]
+    if not future.done():
+        if error is None:
+            future.set_result(cache_path(key))
+        else:
+            future.set_exception(error)
+
+def touch_cached(path):
+    """Mark a cached WAV as used, returning False if it is not cached
+
+    Only the access time is set (explicitly, as relatime/noatime mounts do not keep
+    it current), so the cache can be pruned in least recently used order without
+    changing the Last-Modified of cached responses.
+    """
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except FileNotFoundError:
+        return False
+    return True
+
+def prune_cache():
+    """Delete stale temp files and cached WAVs unused for CACHE_MAX_AGE, then the least recently used WAVs until the cache fits in CACHE_MAX_BYTES"""
+    now = time.time()
+    entries = []
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith('.wav'):
+                entries.append((st.st_atime, st.st_size, entry.path))
+            elif entry.name.endswith('.tmp') and now - st.st_mtime > CACHE_TMP_MAX_AGE:
+                # Left behind by a process killed while writing; live writes keep their mtime current
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = now - CACHE_MAX_AGE
+    for atime, size, path in entries:
+        if total <= CACHE_MAX_BYTES and atime >= cutoff:
+            break
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def maybe_prune_cache():
+    """Prune the cache if it was not pruned within the last CACHE_PRUNE_INTERVAL seconds"""
+    global _LAST_CACHE_PRUNE
+    with _CACHE_PRUNE_LOCK:
+        now = time.monotonic()
+        if _LAST_CACHE_PRUNE is not None and now - _LAST_CACHE_PRUNE < CACHE_PRUNE_INTERVAL:
+            return
+        _LAST_CACHE_PRUNE = now
+
+    try:
+        prune_cache()
+    except OSError as e:
+        print(f"Warning: Could not prune cache: {e}")
+
+def wav_stream_header(sample_rate):
+    """16-bit mono WAV header with unknown (0xFFFFFFFF) sizes, for audio of unknown length"""
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 0xFFFFFFFF, b'WAVE',
+        b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', 0xFFFFFFFF
+    )
+
+@lru_cache(maxsize=PHONEME_CACHE_SIZE)
+def phoneme_ids(voice_name, text):
+    """Phoneme ids for each sentence of text, as fed to the voice model"""
+    voice = get_voice(voice_name)
+    with PHONEMIZE_LOCK:
+        sentences = voice.phonemize(text)
+    return tuple(tuple(voice.phonemes_to_ids(phonemes)) for phonemes in sentences)
+
+def synthesize_chunks(voice, sentences):
+    """Yield 8kHz 16-bit PCM chunks as Piper synthesizes each sentence's phoneme ids"""
+    resampler = soxr.ResampleStream(
+        voice.config.sample_rate, OUTPUT_SAMPLE_RATE, 1, dtype='int16', quality='HQ'
+    )
+
+    for ids in sentences:
+        raw = voice.synthesize_ids_to_raw(ids)
+        pcm = np.frombuffer(raw, dtype=np.int16)
+        yield resampler.resample_chunk(pcm).tobytes()
+
+    # Flush the resampler's remaining samples
+    yield resampler.resample_chunk(np.zeros(0, dtype=np.int16), last=True).tobytes()
+
+def stream_and_cache(key, chunks, future):
+    """Yield a streamed WAV (header, then PCM chunks) while writing the same audio to the cache
+
+    The cache copy is written to a temp file with a proper header and renamed into
+    place once synthesis completes, so readers never see a partially written file.
+    The claimed synthesis future is resolved when the stream ends.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=CACHE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f, wave.open(f, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(OUTPUT_SAMPLE_RATE)
+
+            yield wav_stream_header(OUTPUT_SAMPLE_RATE)
+            for chunk in chunks:
+                wav_file.writeframesraw(chunk)
+                yield chunk
+        os.replace(tmp_path, cache_path(key))
+    except BaseException as e:
+        os.unlink(tmp_path)
+        finish_synthesis(key, future, e if isinstance(e, Exception) else RuntimeError('Synthesis was interrupted'))
+        raise
+    finish_synthesis(key, future)
+    maybe_prune_cache()
+
+def coalesce(chunks, block_size=STREAM_BLOCK_SIZE):
+    """Join streamed chunks into blocks of at least block_size bytes, to cut down on socket writes
+
+    The WAV header and the first audio chunk are sent together straight away, so the
+    time to first audio is unchanged.
+    """
+    with closing(chunks):
+        buf = bytearray()
+        for index, chunk in enumerate(chunks):
+            buf += chunk
+            # Chunk 0 is the WAV header, chunk 1 the first audio
+            if index == 1 or len(buf) >= block_size:
+                yield bytes(buf)
+                buf.clear()
+        if buf:
+            yield bytes(buf)
+
+def prepend(first, chunks):
+    """Yield first, then the rest of chunks (closed along with this generator)"""
+    with closing(chunks):
+        yield first
+        yield from chunks
+
+def iter_voice_models():
+    """Yield the file names of the .onnx voice models in VOICES_DIR"""
+    try:
+        with os.scandir(VOICES_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith('.onnx') and entry.is_file():
+                    yield entry.name
+    except FileNotFoundError:
+        return
+
+# Voice listings are rebuilt only when the voices directory changes (voices added or removed)
+_METADATA_CACHE = {'mtime': None, 'data': None}
+_VOICES_CACHE = {'mtime': None, 'data': None}
+
+def cached_for_voices_dir(cache, build):
+    """Return cache['data'], calling build() again if VOICES_DIR changed since it was cached"""
+    try:
+        mtime = os.stat(VOICES_DIR).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    if cache['data'] is None or cache['mtime'] != mtime:
+        cache['data'] = build()
+        cache['mtime'] = mtime
+    return cache['data']
 
 def get_voice_metadata():
     """Get metadata about installed voices from their JSON files"""
+    return cached_for_voices_dir(_METADATA_CACHE, load_voice_metadata)
+
+def load_voice_metadata():
     voices = {}
-    if os.path.exists(VOICES_DIR):
-        for f in os.listdir(VOICES_DIR):
-            if f.endswith('.onnx'):
-                voice_name = f.replace('.onnx', '')
-                json_path = os.path.join(VOICES_DIR, f'{voice_name}.onnx.json')
-                meta = {'name': voice_name}
-
-                # Try to parse metadata
-                if os.path.exists(json_path):
-                    try:
-                        import json
-                        with open(json_path, 'r') as jf:
-                            data = json.load(jf)
-                            meta['sample_rate'] = data.get('audio', {}).get('sample_rate', 22050)
-                            meta['language'] = data.get('language', {}).get('code', 'en')
-                    except:
-                        meta['sample_rate'] = 22050
-                        meta['language'] = 'en'
-                else:
-                    meta['sample_rate'] = 22050
-                    meta['language'] = 'en'
-
-                voices[voice_name] = meta
+    for f in iter_voice_models():
+        voice_name = f.replace('.onnx', '')
+        json_path = os.path.join(VOICES_DIR, f'{voice_name}.onnx.json')
+        meta = {'name': voice_name}
+
+        # Try to parse metadata
+        if os.path.exists(json_path):
+            try:
+                with open(json_path, 'r') as jf:
+                    data = json.load(jf)
+                    meta['sample_rate'] = data.get('audio', {}).get('sample_rate', 22050)
+                    meta['language'] = data.get('language', {}).get('code', 'en')
+            except:
+                meta['sample_rate'] = 22050
+                meta['language'] = 'en'
+        else:
+            meta['sample_rate'] = 22050
+            meta['language'] = 'en'
+
+        voices[voice_name] = meta
     return voices
 
+def tts_response(text, voice_name):
+    """Build the WAV response for text spoken by voice_name (shared by /generate and /test)"""
+    # Validate voice exists
+    model_path = os.path.join(VOICES_DIR, f'{voice_name}.onnx')
+
+    if not os.path.exists(model_path):
+        return jsonify({"error": f"Voice not found: {voice_name}"}), 404
+
+    try:
+        key = cache_key(voice_name, text)
+        future = claim_synthesis(key)
+
+        if future is None:
+            # Served through wsgi.file_wrapper, which lets servers such as gunicorn use sendfile()
+            response = send_from_directory(
+                CACHE_DIR,
+                f'{key}.wav',
+                mimetype='audio/wav',
+                as_attachment=True,
+                download_name='output.wav',
+                conditional=True
+            )
+            response.headers['Cache-Control'] = 'public, max-age=86400'
+            return response
+
+        # Stream audio as it is synthesized, caching it for later requests
+        try:
+            voice = get_voice(voice_name)
+            sentences = phoneme_ids(voice_name, text)
+        except Exception as e:
+            finish_synthesis(key, future, e)
+            raise
+
+        # Synthesize the first block before responding, so a failure still gets a JSON error
+        chunks = coalesce(stream_and_cache(key, synthesize_chunks(voice, sentences), future))
+        try:
+            first = next(chunks)
+        except BaseException:
+            chunks.close()
+            raise
+
+        response = Response(
+            prepend(first, chunks),
+            mimetype='audio/wav',
+            headers={'Content-Disposition': 'attachment; filename=output.wav'}
+        )
+        # Release waiting requests even if the stream is never consumed
+        response.call_on_close(
+            lambda: finish_synthesis(key, future, RuntimeError('Synthesis was not completed'))
+        )
+        return response
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/generate', methods=['POST'])
 def generate():
     """Generate TTS audio from text
@@ -67,77 +472,7 @@ def generate():
 
     voice_name = data.get('voice', DEFAULT_VOICE)
 
-    # Validate voice exists
-    model_path = os.path.join(VOICES_DIR, f'{voice_name}.onnx')
-    json_path = os.path.join(VOICES_DIR, f'{voice_name}.onnx.json')
-
-    if not os.path.exists(model_path):
-        return jsonify({"error": f"Voice not found: {voice_name}"}), 404
-
-    try:
-        # Create temp file for output
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as tmp:
-            tmp_path = tmp.name
-
-        # Generate audio using piper CLI
-        # Piper outputs raw audio, we pipe through sox to convert to 8kHz WAV for Asterisk
-        piper_cmd = [
-            'piper',
-            '--model', model_path,
-            '--config', json_path,
-            '--output_file', tmp_path
-        ]
-
-        # Run piper with text input
-        process = subprocess.run(
-            piper_cmd,
-            input=text.encode('utf-8'),
-            capture_output=True,
-            timeout=30
-        )
-
-        if process.returncode != 0:
-            error_msg = process.stderr.decode('utf-8', errors='ignore')
-            return jsonify({"error": f"Piper failed: {error_msg}"}), 500
-
-        # Convert to 8kHz mono WAV for Asterisk (using sox)
-        output_path = tmp_path.replace('.wav', '_8k.wav')
-        sox_cmd = [
-            'sox', tmp_path,
-            '-r', '8000',  # 8kHz sample rate
-            '-c', '1',     # Mono
-            output_path
-        ]
-
-        sox_result = subprocess.run(sox_cmd, capture_output=True, timeout=10)
-
-        # Clean up original temp file
-        if os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-
-        if sox_result.returncode != 0:
-            # Fall back to original file if sox fails
-            output_path = tmp_path
-
-        # Read the output file and return
-        with open(output_path, 'rb') as f:
-            audio_data = f.read()
-
-        # Clean up
-        if os.path.exists(output_path):
-            os.unlink(output_path)
-
-        return send_file(
-            io.BytesIO(audio_data),
-            mimetype='audio/wav',
-            as_attachment=True,
-            download_name='output.wav'
-        )
-
-    except subprocess.TimeoutExpired:
-        return jsonify({"error": "TTS generation timed out"}), 500
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    return tts_response(text, voice_name)
 
 @app.route('/voices', methods=['GET'])
 def list_voices():
@@ -157,52 +492,66 @@ def list_voices():
             ]
         }
     """
+    body = cached_for_voices_dir(_VOICES_CACHE, build_voice_list)
+    return app.response_class(body, mimetype='application/json')
+
+def build_voice_list():
+    """Serialized /voices response for the voices currently installed"""
     voices = []
 
-    if os.path.exists(VOICES_DIR):
-        for f in sorted(os.listdir(VOICES_DIR)):
-            if f.endswith('.onnx'):
-                voice_id = f.replace('.onnx', '')
-
-                # Parse voice info from name (e.g., en_US-lessac-medium)
-                parts = voice_id.split('-')
-                if len(parts) >= 3:
-                    lang = parts[0]
-                    name = parts[1]
-                    quality = parts[2] if len(parts) > 2 else 'medium'
-                else:
-                    lang = 'en_US'
-                    name = voice_id
-                    quality = 'medium'
-
-                # Determine gender from common voice names
-                female_names = ['lessac', 'amy', 'kristin', 'kathleen', 'alba', 'cori', 'jenny']
-                male_names = ['ryan', 'joe', 'alan', 'aru', 'kusal', 'arctic']
-
-                gender = 'unknown'
-                name_lower = name.lower()
-                if any(fn in name_lower for fn in female_names) or 'female' in name_lower:
-                    gender = 'female'
-                elif any(mn in name_lower for mn in male_names) or 'male' in name_lower:
-                    gender = 'male'
-
-                # Create display name
-                display_name = name.replace('_', ' ').title()
-                if gender != 'unknown':
-                    gender_symbol = 'F' if gender == 'female' else 'M'
-                    display_name = f"{display_name} ({lang} {gender_symbol})"
-                else:
-                    display_name = f"{display_name} ({lang})"
-
-                voices.append({
-                    "id": voice_id,
-                    "name": display_name,
-                    "language": lang,
-                    "gender": gender,
-                    "quality": quality
-                })
-
-    return jsonify({"voices": voices})
+    for f in sorted(iter_voice_models()):
+        voice_id = f.replace('.onnx', '')
+
+        # Parse voice info from name (e.g., en_US-lessac-medium)
+        parts = voice_id.split('-')
+        if len(parts) >= 3:
+            lang = parts[0]
+            name = parts[1]
+            quality = parts[2] if len(parts) > 2 else 'medium'
+        else:
+            lang = 'en_US'
+            name = voice_id
+            quality = 'medium'
+
+        # Determine gender from common voice names
+        gender = 'unknown'
+        name_lower = name.lower()
+        if any(fn in name_lower for fn in FEMALE_VOICE_NAMES) or 'female' in name_lower:
+            gender = 'female'
+        elif any(mn in name_lower for mn in MALE_VOICE_NAMES) or 'male' in name_lower:
+            gender = 'male'
+
+        # Create display name
+        display_name = name.replace('_', ' ').title()
+        if gender != 'unknown':
+            gender_symbol = 'F' if gender == 'female' else 'M'
+            display_name = f"{display_name} ({lang} {gender_symbol})"
+        else:
+            display_name = f"{display_name} ({lang})"
+
+        voices.append({
+            "id": voice_id,
+            "name": display_name,
+            "language": lang,
+            "gender": gender,
+            "quality": quality
+        })
+
+    return orjson.dumps({"voices": voices})
+
+# Whether the piper package can be imported, checked once per process
+_PIPER_AVAILABLE = None
+
+def is_piper_available():
+    """Check that Piper can synthesize (voices are loaded in-process, so no CLI is needed)"""
+    global _PIPER_AVAILABLE
+    if _PIPER_AVAILABLE is None:
+        try:
+            import piper.voice
+            _PIPER_AVAILABLE = True
+        except ImportError:
+            _PIPER_AVAILABLE = False
+    return _PIPER_AVAILABLE
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -216,17 +565,10 @@ def health():
         }
     """
     # Check if piper is available
-    piper_available = False
-    try:
-        result = subprocess.run(['piper', '--help'], capture_output=True, timeout=5)
-        piper_available = result.returncode == 0
-    except:
-        pass
+    piper_available = is_piper_available()
 
     # Count voices
-    voices_count = 0
-    if os.path.exists(VOICES_DIR):
-        voices_count = len([f for f in os.listdir(VOICES_DIR) if f.endswith('.onnx')])
+    voices_count = sum(1 for _ in iter_voice_models())
 
     status = "ok" if piper_available and voices_count > 0 else "degraded"
 
@@ -243,8 +585,28 @@ def test():
     test_text = request.args.get('text', 'Hello, this is a test of the Piper text to speech system.')
     voice = request.args.get('voice', DEFAULT_VOICE)
 
-    # Use the generate endpoint
-    return generate.__wrapped__(text=test_text, voice=voice)
+    return tts_response(test_text, voice)
+
+def preload_voices():
+    """Load the PRELOAD_VOICES models, so requests for them never wait on a model load"""
+    if PRELOAD_VOICES.strip() == '*':
+        voice_names = [f.replace('.onnx', '') for f in sorted(iter_voice_models())]
+    else:
+        voice_names = [name.strip() for name in PRELOAD_VOICES.split(',') if name.strip()]
+
+    if len(voice_names) > MAX_LOADED_VOICES:
+        print(f"Warning: Preloading only {MAX_LOADED_VOICES} of {len(voice_names)} voices (MAX_LOADED_VOICES)")
+        voice_names = voice_names[:MAX_LOADED_VOICES]
+
+    for voice_name in voice_names:
+        try:
+            get_voice(voice_name)
+        except Exception as e:
+            print(f"Warning: Could not preload voice {voice_name}: {e}")
+
+# Each server process (dev server or gunicorn worker) loads its voices
+# before handling requests, so the first caller does not pay the model load
+preload_voices()
 
 if __name__ == '__main__':
     print(f"Starting Piper TTS Server...")
@@ -252,7 +614,7 @@ if __name__ == '__main__':
 
     # Check for voices
     if os.path.exists(VOICES_DIR):
-        voice_count = len([f for f in os.listdir(VOICES_DIR) if f.endswith('.onnx')])
+        voice_count = sum(1 for _ in iter_voice_models())
         print(f"Found {voice_count} voice models")
     else:
         print(f"Warning: Voices directory does not exist")
@@ -1227,10 +1227,10 @@ else
 # Install Kokoro dependencies
 log "  Installing Kokoro dependencies (this may take a few minutes)..."
 "$KOKORO_VENV/bin/pip" install --upgrade pip >> "$LOG_FILE" 2>&1
-log "  Installing kokoro-onnx, soundfile, numpy..."
-"$KOKORO_VENV/bin/pip" install kokoro-onnx soundfile numpy >> "$LOG_FILE" 2>&1 || {
+log "  Installing kokoro-onnx, soundfile, numpy, orjson..."
+"$KOKORO_VENV/bin/pip" install --upgrade "kokoro-onnx>=0.4.2" soundfile numpy orjson >> "$LOG_FILE" 2>&1 || {
     warn "Kokoro dependencies failed to install. Kokoro TTS will be unavailable."
-    warn "You can try manually: $KOKORO_VENV/bin/pip install kokoro-onnx soundfile numpy"
+    warn "You can try manually: $KOKORO_VENV/bin/pip install --upgrade 'kokoro-onnx>=0.4.2' soundfile numpy orjson"
 }
 log "  ✓ Kokoro dependencies installed"
 
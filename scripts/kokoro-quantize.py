@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Kokoro model quantization for NovaPBX
+Converts the FP32 Kokoro ONNX model to int8 for faster CPU inference.
+
+MatMul/Gemm weights are quantized to int8 (dynamic quantization), which makes
+them 4x smaller and lets ONNX Runtime use int8 dot-product kernels (AVX-512 VNNI,
+ARM dotprod). Run once; kokoro-tts-server.py loads the int8 model when it is
+present (set KOKORO_FP32=1 to keep using the original model).
+
+Requires: pip install onnxruntime onnx
+
+Usage: kokoro-quantize.py [model_in] [model_out]
+"""
+
+import os
+import sys
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s [%(levelname)s] %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def main():
+    model_in = sys.argv[1] if len(sys.argv) > 1 else os.path.join(MODEL_DIR, "kokoro-v1.0.onnx")
+    model_out = sys.argv[2] if len(sys.argv) > 2 else os.path.join(MODEL_DIR, "kokoro-v1.0.int8.onnx")
+
+    if not os.path.exists(model_in):
+        logger.error(f"Model not found: {model_in}")
+        sys.exit(1)
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    logger.info(f"Quantizing {model_in} to int8...")
+    # Write to a temp path first so the server never picks up a half-written model
+    tmp_out = f"{model_out}.tmp"
+    quantize_dynamic(
+        model_in,
+        tmp_out,
+        weight_type=QuantType.QInt8,
+        op_types_to_quantize=['MatMul', 'Gemm']
+    )
+    os.replace(tmp_out, model_out)
+
+    size_in = os.path.getsize(model_in) / (1024 * 1024)
+    size_out = os.path.getsize(model_out) / (1024 * 1024)
+    logger.info(f"Saved {model_out} ({size_in:.0f}MB -> {size_out:.0f}MB)")
+
+if __name__ == '__main__':
+    main()
@@ -4,14 +4,29 @@ Kokoro TTS Server for NovaPBX
 A simple HTTP server that accepts TTS requests and returns WAV audio.
 """
 
+import io
 import os
 import sys
-import json
+import time
+import wave
+import re
+import struct
+import queue
+import shutil
+import socket
+import hashlib
 import tempfile
+import itertools
 import logging
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import threading
+from functools import lru_cache
+from contextlib import closing, contextmanager
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import parse_qs, urlparse
 
+import orjson
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,145 +34,730 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Lazy load kokoro to avoid slow startup
-kokoro_pipeline = None
+# Generated audio is cached here, keyed by a hash of voice, speed and text
+CACHE_DIR = os.environ.get(
+    'KOKORO_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
+)
+# Cache limits: files unused for longer than the max age are deleted, then the least
+# recently used until the cache fits in the max size. Checked at most once per interval.
+CACHE_MAX_BYTES = int(os.environ.get('KOKORO_CACHE_MAX_MB', 1024)) * 1024 * 1024
+CACHE_MAX_AGE = float(os.environ.get('KOKORO_CACHE_MAX_AGE_DAYS', 7)) * 86400
+CACHE_PRUNE_INTERVAL = 60
+# Temp files of syntheses that were killed mid-write are deleted after this many seconds
+CACHE_TMP_MAX_AGE = 600
+
+# Streamed audio is written in blocks of at least this many bytes
+STREAM_BLOCK_SIZE = 64 * 1024
+# Seconds a request waits for its audio (matches the BotPBX client timeout)
+SYNTHESIS_TIMEOUT = 60
+
+# Syntheses in progress keyed by cache key, so identical concurrent requests share one synthesis
+INFLIGHT = {}
+INFLIGHT_LOCK = threading.Lock()
+
+# Last time the cache was pruned (time.monotonic())
+last_cache_prune = None
+cache_prune_lock = threading.Lock()
+
+# Number of Kokoro engines loaded at startup. Each request thread checks out its own engine,
+# so up to this many different prompts are synthesized at once; use 1 on a single GPU, up to
+# the CPU count for CPU inference (each engine holds its own model).
+POOL_SIZE = int(os.environ.get('KOKORO_POOL', 1))
+
+# ONNX Runtime threads per engine, sized so the pool does not oversubscribe the CPU
+ONNX_THREADS = int(os.environ.get(
+    'KOKORO_ONNX_THREADS',
+    max(1, min(4, (os.cpu_count() or 1) // max(1, POOL_SIZE)))
+))
+
+# Inference device: 'auto' uses CUDA when a GPU build of ONNX Runtime (onnxruntime-gpu)
+# is installed, 'cpu' forces CPU inference
+DEVICE = os.environ.get('KOKORO_DEVICE', 'auto')
+CUDA_DEVICE_ID = int(os.environ.get('KOKORO_CUDA_DEVICE', 0))
+
+# Model files. The int8 model (created by kokoro-quantize.py) is used for CPU inference
+# when present, unless KOKORO_FP32=1 forces the original FP32 model.
+MODEL_FILE = "kokoro-v1.0.onnx"
+INT8_MODEL_FILE = "kokoro-v1.0.int8.onnx"
+VOICES_FILE = "voices-v1.0.bin"
+USE_FP32 = os.environ.get('KOKORO_FP32') == '1'
+
+# Model downloads, used when the model files are missing. Downloads are verified
+# against the SHA-256 digests GitHub publishes for the release assets; the
+# KOKORO_*_SHA256 variables pin the digests instead.
+MODEL_URL = "https://github.com/thewh1teagle/kokoro-onnx/releases/download/model-files-v1.0/kokoro-v1.0.onnx"
+VOICES_URL = "https://github.com/thewh1teagle/kokoro-onnx/releases/download/model-files-v1.0/voices-v1.0.bin"
+RELEASE_API_URL = "https://api.github.com/repos/thewh1teagle/kokoro-onnx/releases/tags/model-files-v1.0"
+MODEL_SHA256 = os.environ.get('KOKORO_MODEL_SHA256')
+VOICES_SHA256 = os.environ.get('KOKORO_VOICES_SHA256')
+DOWNLOAD_PARTS = 8
+
+# Pool of loaded Kokoro engines, checked out for the duration of a synthesis
+ENGINES = queue.Queue()
+
+# Number of phonemized texts kept in memory (recurring IVR prompts skip espeak-ng)
+PHONEME_CACHE_SIZE = int(os.environ.get('KOKORO_PHONEME_CACHE_SIZE', 4096))
+LANG = 'en-us'
+# Streamed audio is synthesized one sentence at a time
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Tokenizer of the first loaded engine, shared by all engines for phonemization.
+# espeak-ng keeps global state, so calls into it are serialized.
+tokenizer = None
+tokenizer_lock = threading.Lock()
+
+# File name of the loaded model, part of the cache key so switching models
+# (int8/FP32, CPU/GPU) does not serve audio made by the previous one
+model_name = None
+
+def onnx_session_options():
+    """ONNX Runtime session options tuned for CPU inference."""
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = ONNX_THREADS
+    options.inter_op_num_threads = 1
+    options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.enable_cpu_mem_arena = True
+    return options
+
+@lru_cache(maxsize=None)
+def use_cuda():
+    """Whether Kokoro sessions run on the GPU."""
+    import onnxruntime
+
+    return DEVICE != 'cpu' and 'CUDAExecutionProvider' in onnxruntime.get_available_providers()
+
+def onnx_providers():
+    """Execution providers for Kokoro sessions, with CPU as the fallback."""
+    if use_cuda():
+        return [
+            ('CUDAExecutionProvider', {'device_id': CUDA_DEVICE_ID, 'cudnn_conv_algo_search': 'HEURISTIC'}),
+            'CPUExecutionProvider'
+        ]
+    return ['CPUExecutionProvider']
+
+def create_kokoro(model_path, voices_path):
+    """Create a Kokoro pipeline on an ONNX Runtime session with tuned options."""
+    import onnxruntime
+    from kokoro_onnx import Kokoro
+
+    session = onnxruntime.InferenceSession(
+        model_path,
+        sess_options=onnx_session_options(),
+        providers=onnx_providers()
+    )
+    return Kokoro.from_session(session, voices_path)
+
+def model_file(model_dir=''):
+    """Path of the Kokoro model to load from model_dir, preferring the int8 model on CPU.
+
+    Dynamically quantized int8 ops have no CUDA kernels, so the GPU always uses FP32.
+    """
+    int8_path = os.path.join(model_dir, INT8_MODEL_FILE)
+    if not USE_FP32 and not use_cuda() and os.path.exists(int8_path):
+        return int8_path
+    return os.path.join(model_dir, MODEL_FILE)
+
+def parallel_download(url, path, sha256=None, parts=DOWNLOAD_PARTS):
+    """Download url to path using parallel HTTP Range requests.
+
+    Each range is written to its own path.partN file, so an interrupted download
+    resumes where every part stopped. The parts are then joined into path.part,
+    checked against sha256 (when given) and renamed into place.
+    """
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+
+    # A one-byte range request tells us the size and whether ranges are supported
+    probe = urllib.request.Request(url, headers={'Range': 'bytes=0-0'})
+    with urllib.request.urlopen(probe, timeout=30) as resp:
+        url = resp.geturl()  # Skip the redirect on every part
+        content_range = resp.headers.get('Content-Range', '')
+        total = content_range.rsplit('/', 1)[-1]
+        ranged = resp.status == 206 and total.isdigit()
+
+    if ranged:
+        total = int(total)
+        part_size = -(-total // parts)
+        ranges = [(start, min(start + part_size, total) - 1) for start in range(0, total, part_size)]
+    else:
+        ranges = [(0, None)]
+
+    def fetch(index):
+        start, end = ranges[index]
+        part_path = f"{path}.part{index}"
+
+        if end is None:
+            # No range support: plain download from the start
+            request = urllib.request.Request(url)
+            mode = 'wb'
+        else:
+            have = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if start + have > end:
+                return
+            request = urllib.request.Request(url, headers={'Range': f"bytes={start + have}-{end}"})
+            mode = 'ab'
+
+        with urllib.request.urlopen(request, timeout=60) as resp, open(part_path, mode) as f:
+            shutil.copyfileobj(resp, f, 1024 * 1024)
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        list(executor.map(fetch, range(len(ranges))))
+
+    # Join the parts, hashing as we go
+    digest = hashlib.sha256()
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'wb') as out:
+        for index in range(len(ranges)):
+            with open(f"{path}.part{index}", 'rb') as f:
+                while chunk := f.read(1024 * 1024):
+                    digest.update(chunk)
+                    out.write(chunk)
+        size = out.tell()
+
+    for index in range(len(ranges)):
+        os.unlink(f"{path}.part{index}")
+
+    if ranged and size != total:
+        os.unlink(tmp_path)
+        raise ValueError(f"Incomplete download of {url}: got {size} of {total} bytes")
+    if sha256 and digest.hexdigest() != sha256.lower():
+        os.unlink(tmp_path)
+        raise ValueError(f"Checksum mismatch for {path}: expected {sha256}, got {digest.hexdigest()}")
+    if not sha256:
+        logger.warning(f"No SHA-256 configured for {os.path.basename(path)}, got {digest.hexdigest()}")
+
+    os.replace(tmp_path, path)
+
+def release_digests():
+    """SHA-256 digests GitHub publishes for the model release assets, keyed by file name."""
+    import urllib.request
+
+    request = urllib.request.Request(RELEASE_API_URL, headers={'Accept': 'application/vnd.github+json'})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as resp:
+            release = orjson.loads(resp.read())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not fetch release digests: {e}")
+        return {}
+
+    digests = {}
+    for asset in release.get('assets', []):
+        digest = asset.get('digest') or ''
+        if digest.startswith('sha256:'):
+            digests[asset['name']] = digest.split(':', 1)[1]
+    return digests
+
+def load_kokoro():
+    """Load a Kokoro pipeline, downloading the model files if needed."""
+    global model_name
+    logger.info("Loading Kokoro TTS model...")
+    try:
+        model_path = model_file()
+        kokoro = create_kokoro(model_path, VOICES_FILE)
+        logger.info(f"Kokoro TTS model loaded successfully ({model_path})")
+    except Exception as e:
+        logger.error(f"Failed to load Kokoro model: {e}")
+        logger.info("Attempting to download Kokoro model...")
+        try:
+            # Download model if not present
+            model_dir = os.path.dirname(os.path.abspath(__file__))
+
+            model_path = model_file(model_dir)
+            voices_path = os.path.join(model_dir, VOICES_FILE)
+
+            digests = {}
+            if not (os.path.exists(model_path) and os.path.exists(voices_path)):
+                digests = release_digests()
+
+            if not os.path.exists(model_path):
+                logger.info(f"Downloading Kokoro model to {model_path}...")
+                parallel_download(MODEL_URL, model_path, MODEL_SHA256 or digests.get(MODEL_FILE))
+                logger.info("Kokoro model downloaded")
+
+            if not os.path.exists(voices_path):
+                logger.info(f"Downloading Kokoro voices to {voices_path}...")
+                parallel_download(VOICES_URL, voices_path, VOICES_SHA256 or digests.get(VOICES_FILE))
+                logger.info("Kokoro voices downloaded")
+
+            kokoro = create_kokoro(model_path, voices_path)
+            logger.info("Kokoro TTS model loaded successfully after download")
+        except Exception as e2:
+            logger.error(f"Failed to download/load Kokoro model: {e2}")
+            raise
+    model_name = os.path.basename(model_path)
+    return kokoro
+
+def init_engines(size=POOL_SIZE):
+    """Load the engine pool, returning the number of engines loaded."""
+    global tokenizer
+    if size < 1:
+        raise ValueError(f"KOKORO_POOL must be at least 1, got {size}")
+
+    if use_cuda():
+        logger.info(f"Using CUDA device {CUDA_DEVICE_ID} for Kokoro inference")
+        if size > 1:
+            # Several sessions on one GPU contend for it and can trip CUDA asserts
+            logger.warning(f"KOKORO_POOL={size} ignored on GPU, using a single engine")
+            size = 1
+
+    for _ in range(size):
+        engine = load_kokoro()
+        ENGINES.put(engine)
+    tokenizer = engine.tokenizer
+    logger.info(f"Kokoro engine pool ready ({size} engines)")
+    return size
+
+@contextmanager
+def checkout_engine(timeout=SYNTHESIS_TIMEOUT):
+    """Borrow an engine from the pool, returning it when done.
+
+    Waits up to timeout seconds for an engine when all of them are busy.
+    """
+    try:
+        engine = ENGINES.get(timeout=timeout)
+    except queue.Empty:
+        raise TimeoutError(f"No Kokoro engine became free within {timeout} seconds") from None
+    try:
+        yield engine
+    finally:
+        ENGINES.put(engine)
+
+@lru_cache(maxsize=PHONEME_CACHE_SIZE)
+def phonemize(text, lang=LANG):
+    """Phonemes for text, as passed to Kokoro with is_phonemes=True."""
+    with tokenizer_lock:
+        return tokenizer.phonemize(text, lang)
+
+def cache_key(voice, text, speed=1.0):
+    """Cache key for a synthesis request with the loaded model."""
+    return hashlib.sha256(f"{model_name}|{voice}|{speed}|{text}".encode('utf-8')).hexdigest()
+
+def cache_path(key):
+    """Path of the cached WAV for a cache key."""
+    return os.path.join(CACHE_DIR, f"{key}.wav")
+
+def claim_synthesis(key):
+    """Wait until the audio for key is cached, or claim its synthesis.
+
+    Returns None once the audio is cached. Otherwise returns a Future that this
+    request now owns and must resolve with finish_synthesis(); identical requests
+    wait on it meanwhile. If the owner fails, a waiter takes over the synthesis.
+    """
+    while True:
+        with INFLIGHT_LOCK:
+            if touch_cached(cache_path(key)):
+                logger.info(f"Cache hit: {key}")
+                return None
+            future = INFLIGHT.get(key)
+            if future is None:
+                future = INFLIGHT[key] = Future()
+                return future
+
+        logger.info(f"Waiting for in-flight synthesis: {key}")
+        try:
+            future.result(timeout=SYNTHESIS_TIMEOUT)
+        except FutureTimeoutError:
+            raise
+        except Exception:
+            pass
+
+def finish_synthesis(key, future, error=None):
+    """Release a claimed synthesis, waking up the requests waiting on it."""
+    with INFLIGHT_LOCK:
+        if INFLIGHT.get(key) is future:
+            del INFLIGHT[key]
+    if not future.done():
+        if error is None:
+            future.set_result(cache_path(key))
+        else:
+            future.set_exception(error)
+
+def touch_cached(path):
+    """Mark a cached WAV as used, returning False if it is not cached.
+
+    The access time is set explicitly (relatime/noatime mounts do not keep it
+    current), so the cache can be pruned in least recently used order.
+    """
+    try:
+        os.utime(path, (time.time(), os.stat(path).st_mtime))
+    except FileNotFoundError:
+        return False
+    return True
+
+def prune_cache():
+    """Delete stale temp files and cached WAVs unused for CACHE_MAX_AGE, then the
+    least recently used WAVs until the cache fits in CACHE_MAX_BYTES."""
+    now = time.time()
+    entries = []
+    with os.scandir(CACHE_DIR) as it:
+        for entry in it:
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith('.wav'):
+                entries.append((st.st_atime, st.st_size, entry.path))
+            elif entry.name.endswith('.tmp') and now - st.st_mtime > CACHE_TMP_MAX_AGE:
+                # Left behind by a process killed while writing; live writes keep their mtime current
+                try:
+                    os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = now - CACHE_MAX_AGE
+    removed = 0
+    for atime, size, path in entries:
+        if total <= CACHE_MAX_BYTES and atime >= cutoff:
+            break
+        try:
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+
+    if removed:
+        logger.info(f"Pruned {removed} cached files ({total // (1024 * 1024)} MB left)")
 
-def get_kokoro():
-    """Lazy initialization of Kokoro pipeline."""
-    global kokoro_pipeline
-    if kokoro_pipeline is None:
-        logger.info("Loading Kokoro TTS model (first request)...")
+def maybe_prune_cache():
+    """Prune the cache if it was not pruned within the last CACHE_PRUNE_INTERVAL seconds."""
+    global last_cache_prune
+    with cache_prune_lock:
+        now = time.monotonic()
+        if last_cache_prune is not None and now - last_cache_prune < CACHE_PRUNE_INTERVAL:
+            return
+        last_cache_prune = now
+
+    try:
+        prune_cache()
+    except OSError as e:
+        logger.error(f"Cache prune error: {e}")
+
+def cached_synth(key, producer):
+    """Return the path of the cached WAV for key, calling producer() to create it on a miss.
+
+    The audio is written to a temp file in the cache directory and renamed into
+    place, so concurrent readers never see a partially written file. Identical
+    concurrent requests wait for a single producer() call.
+    """
+    future = claim_synthesis(key)
+    path = cache_path(key)
+    if future is None:
+        return path
+
+    try:
+        audio_data = producer()
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=CACHE_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(audio_data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except Exception as e:
+        finish_synthesis(key, future, e)
+        raise
+
+    finish_synthesis(key, future)
+    maybe_prune_cache()
+    return path
+
+def wav_stream_header(sample_rate):
+    """16-bit mono WAV header with unknown (0xFFFFFFFF) sizes, for audio of unknown length."""
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 0xFFFFFFFF, b'WAVE',
+        b'fmt ', 16, 1, 1, sample_rate, sample_rate * 2, 2, 16,
+        b'data', 0xFFFFFFFF
+    )
+
+def split_sentences(phonemes):
+    """Split a phoneme string at sentence ends (espeak-ng keeps the punctuation)."""
+    return [sentence for sentence in SENTENCE_END.split(phonemes) if sentence.strip()]
+
+def synthesize_chunks(text, voice, speed):
+    """Yield (pcm, sample_rate) 16-bit PCM chunks as Kokoro synthesizes each sentence.
+
+    Synthesis runs on its own thread and hands chunks over through a queue, so the
+    engine goes back to the pool as soon as synthesis is done rather than after the
+    audio has been written to a slow client. Each sentence is a plain kokoro.create()
+    call, so errors surface normally, and a stream that is closed early stops
+    synthesizing at the next sentence.
+    """
+    import numpy as np
+
+    sentences = split_sentences(phonemize(text))
+    chunks = queue.Queue()
+    cancelled = threading.Event()
+
+    def produce():
         try:
-            from kokoro_onnx import Kokoro
-            kokoro_pipeline = Kokoro(
-                "kokoro-v1.0.onnx",  # Model file
-                "voices-v1.0.bin"    # Voices file
-            )
-            logger.info("Kokoro TTS model loaded successfully")
+            with checkout_engine() as kokoro:
+                for sentence in sentences:
+                    if cancelled.is_set():
+                        return
+                    samples, sample_rate = kokoro.create(sentence, voice=voice, speed=speed, is_phonemes=True)
+                    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+                    chunks.put((pcm.tobytes(), sample_rate))
         except Exception as e:
-            logger.error(f"Failed to load Kokoro model: {e}")
-            logger.info("Attempting to download Kokoro model...")
+            chunks.put(e)
+        else:
+            chunks.put(None)
+
+    threading.Thread(target=produce, name='kokoro-stream', daemon=True).start()
+
+    try:
+        while True:
             try:
-                # Download model if not present
-                import urllib.request
-                model_dir = os.path.dirname(os.path.abspath(__file__))
-
-                model_url = "https://github.com/thewh1teagle/kokoro-onnx/releases/download/model-files-v1.0/kokoro-v1.0.onnx"
-                voices_url = "https://github.com/thewh1teagle/kokoro-onnx/releases/download/model-files-v1.0/voices-v1.0.bin"
-
-                model_path = os.path.join(model_dir, "kokoro-v1.0.onnx")
-                voices_path = os.path.join(model_dir, "voices-v1.0.bin")
-
-                if not os.path.exists(model_path):
-                    logger.info(f"Downloading Kokoro model to {model_path}...")
-                    urllib.request.urlretrieve(model_url, model_path)
-                    logger.info("Kokoro model downloaded")
-
-                if not os.path.exists(voices_path):
-                    logger.info(f"Downloading Kokoro voices to {voices_path}...")
-                    urllib.request.urlretrieve(voices_url, voices_path)
-                    logger.info("Kokoro voices downloaded")
-
-                from kokoro_onnx import Kokoro
-                kokoro_pipeline = Kokoro(model_path, voices_path)
-                logger.info("Kokoro TTS model loaded successfully after download")
-            except Exception as e2:
-                logger.error(f"Failed to download/load Kokoro model: {e2}")
-                raise
-    return kokoro_pipeline
+                item = chunks.get(timeout=SYNTHESIS_TIMEOUT)
+            except queue.Empty:
+                raise TimeoutError(f"No audio was generated within {SYNTHESIS_TIMEOUT} seconds") from None
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+
+def stream_and_cache(key, chunks, future):
+    """Yield a streamed WAV (header, then PCM chunks) while writing the same audio to the cache.
+
+    The cache copy is written to a temp file with a proper header and renamed into
+    place once synthesis completes, so readers never see a partially written file.
+    The claimed synthesis future is resolved when the stream ends.
+    """
+    tmp_path = None
+    try:
+        # The first chunk gives the sample rate for the headers; a synthesis that
+        # fails before producing audio raises here, before anything is written
+        first = next(chunks, None)
+        if first is None:
+            raise ValueError("Kokoro generated no audio")
+        pcm, sample_rate = first
+
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=CACHE_DIR)
+        with os.fdopen(fd, 'wb') as f, wave.open(f, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+
+            yield wav_stream_header(sample_rate)
+            wav_file.writeframesraw(pcm)
+            yield pcm
+
+            for pcm, _ in chunks:
+                wav_file.writeframesraw(pcm)
+                yield pcm
+        os.replace(tmp_path, cache_path(key))
+    except BaseException as e:
+        if tmp_path is not None:
+            os.unlink(tmp_path)
+        finish_synthesis(key, future, e if isinstance(e, Exception) else RuntimeError("Synthesis was interrupted"))
+        raise
+    finish_synthesis(key, future)
+    maybe_prune_cache()
+
+def coalesce(chunks, block_size=STREAM_BLOCK_SIZE):
+    """Join streamed chunks into blocks of at least block_size bytes, to cut down on socket writes.
+
+    The WAV header and the first audio chunk are sent together straight away, so the
+    time to first audio is unchanged.
+    """
+    with closing(chunks):
+        buf = bytearray()
+        for index, chunk in enumerate(chunks):
+            buf += chunk
+            # Chunk 0 is the WAV header, chunk 1 the first audio
+            if index == 1 or len(buf) >= block_size:
+                yield bytes(buf)
+                buf.clear()
+        if buf:
+            yield bytes(buf)
 
 class TTSHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 for chunked streaming responses; every response sets Content-Length or is chunked
+    protocol_version = 'HTTP/1.1'
+
     def log_message(self, format, *args):
         logger.info(f"{self.address_string()} - {format % args}")
 
+    def send_json(self, status, payload):
+        body = orjson.dumps(payload)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_not_found(self):
+        self.send_response(404)
+        self.send_header('Content-Length', 0)
+        self.end_headers()
+
+    def send_wav_file(self, path):
+        """Send a cached WAV, letting the kernel copy the file to the socket."""
+        with open(path, 'rb') as f:
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/wav')
+            self.send_header('Content-Length', os.fstat(f.fileno()).st_size)
+            self.end_headers()
+            self.connection.sendfile(f)
+
+    def send_wav_stream(self, chunks):
+        """Send a generated WAV stream using chunked transfer encoding.
+
+        The first block is generated before the headers are sent, so a synthesis that
+        fails to start raises here and the caller can still send an error response.
+        """
+        try:
+            first = next(chunks)
+        except BaseException:
+            chunks.close()
+            raise
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        try:
+            for chunk in itertools.chain((first,), chunks):
+                if chunk:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except Exception as e:
+            # Headers are already sent, so the failure can only be signalled by dropping the connection
+            logger.error(f"TTS streaming error: {e}")
+            self.close_connection = True
+        finally:
+            chunks.close()
+
     def do_GET(self):
         """Health check endpoint."""
         if self.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "ok", "engine": "kokoro"}).encode())
+            self.send_json(200, {"status": "ok", "engine": "kokoro"})
             return
 
-        self.send_response(404)
-        self.end_headers()
+        self.send_not_found()
 
     def do_POST(self):
         """Handle TTS synthesis request."""
+        try:
+            # Read the body before any response, so on a kept-alive connection it is
+            # never parsed as the next request
+            content_length = int(self.headers.get('Content-Length', 0))
+            body = self.rfile.read(content_length)
+        except (ValueError, OSError) as e:
+            self.close_connection = True
+            self.send_json(400, {"error": f"Invalid request body: {e}"})
+            return
+
         if self.path != '/synthesize':
-            self.send_response(404)
-            self.end_headers()
+            self.send_not_found()
             return
 
         try:
             # Parse request body
-            content_length = int(self.headers.get('Content-Length', 0))
-            body = self.rfile.read(content_length).decode('utf-8')
-            data = json.loads(body)
+            data = orjson.loads(body)
 
             text = data.get('text', '')
             voice = data.get('voice', 'af_heart')  # Default voice
             output_path = data.get('output_path')
 
             if not text:
-                self.send_response(400)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": "No text provided"}).encode())
+                self.send_json(400, {"error": "No text provided"})
+                return
+
+            speed = 1.0
+            key = cache_key(voice, text, speed)
+
+            if not output_path:
+                # Return audio directly: cached file, or stream it while it is synthesized
+                future = claim_synthesis(key)
+                if future is None:
+                    self.send_wav_file(cache_path(key))
+                    return
+
+                logger.info(f"Streaming: '{text[:50]}...' with voice '{voice}'")
+                try:
+                    chunks = stream_and_cache(key, synthesize_chunks(text, voice, speed), future)
+                    self.send_wav_stream(coalesce(chunks))
+                finally:
+                    # Release waiting requests even if the stream never started
+                    finish_synthesis(key, future, RuntimeError("Synthesis was not completed"))
                 return
 
-            logger.info(f"Synthesizing: '{text[:50]}...' with voice '{voice}'")
-
-            # Get Kokoro pipeline
-            kokoro = get_kokoro()
-
-            # Generate audio
-            samples, sample_rate = kokoro.create(text, voice=voice, speed=1.0)
-
-            # Save to file
-            import soundfile as sf
-
-            if output_path:
-                sf.write(output_path, samples, sample_rate)
-                logger.info(f"Audio saved to {output_path}")
-
-                self.send_response(200)
-                self.send_header('Content-Type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    "success": True,
-                    "output_path": output_path,
-                    "sample_rate": sample_rate,
-                    "duration": len(samples) / sample_rate
-                }).encode())
-            else:
-                # Return audio directly
-                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as f:
-                    sf.write(f.name, samples, sample_rate)
-                    f.seek(0)
-                    audio_data = open(f.name, 'rb').read()
-                    os.unlink(f.name)
-
-                self.send_response(200)
-                self.send_header('Content-Type', 'audio/wav')
-                self.send_header('Content-Length', len(audio_data))
-                self.end_headers()
-                self.wfile.write(audio_data)
+            def produce():
+                logger.info(f"Synthesizing: '{text[:50]}...' with voice '{voice}'")
+
+                # Generate audio
+                phonemes = phonemize(text)
+                with checkout_engine() as kokoro:
+                    samples, sample_rate = kokoro.create(phonemes, voice=voice, speed=speed, is_phonemes=True)
+
+                import soundfile as sf
+
+                buf = io.BytesIO()
+                sf.write(buf, samples, sample_rate, format='WAV', subtype='PCM_16')
+                return buf.getbuffer()
+
+            path = cached_synth(key, produce)
+            shutil.copyfile(path, output_path)
+            logger.info(f"Audio saved to {output_path}")
+
+            with wave.open(path, 'rb') as wav_file:
+                sample_rate = wav_file.getframerate()
+                duration = wav_file.getnframes() / sample_rate
+
+            self.send_json(200, {
+                "success": True,
+                "output_path": output_path,
+                "sample_rate": sample_rate,
+                "duration": duration
+            })
 
         except Exception as e:
             logger.error(f"TTS error: {e}")
-            self.send_response(500)
-            self.send_header('Content-Type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": str(e)}).encode())
+            self.send_json(500, {"error": str(e)})
+
+class TTSServer(ThreadingHTTPServer):
+    """Threaded HTTP server with Nagle disabled on client sockets.
+
+    Send buffers are left to kernel autotuning: a fixed SO_SNDBUF disables it and
+    is capped at twice net.core.wmem_max anyway.
+    """
+
+    def get_request(self):
+        request, client_address = super().get_request()
+        # Send the last small segment of a response immediately instead of waiting on Nagle
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return request, client_address
 
 def main():
     port = int(os.environ.get('KOKORO_PORT', 5003))
     server_address = ('127.0.0.1', port)
 
-    httpd = HTTPServer(server_address, TTSHandler)
+    # Load the models before accepting requests; if that fails, exit so the
+    # process manager restarts the server instead of it failing every request
+    try:
+        init_engines()
+    except Exception as e:
+        logger.error(f"Could not load Kokoro engines: {e}")
+        sys.exit(1)
+
+    httpd = TTSServer(server_address, TTSHandler)
     logger.info(f"Kokoro TTS server starting on port {port}")
-    logger.info("Model will be loaded on first request...")
 
     try:
         httpd.serve_forever()
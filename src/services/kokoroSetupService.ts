@@ -12,6 +12,24 @@ import { createLogger } from '../utils/logger';
 const execAsync = promisify(exec);
 const logger = createLogger('KokoroSetup');
 
+// The server passes is_phonemes to Kokoro.create(), added in kokoro-onnx 0.4.2
+const MIN_KOKORO_ONNX_VERSION = '0.4.2';
+
+/**
+ * Whether a dotted version string is at least the given minimum
+ */
+function versionAtLeast(version: string, minimum: string): boolean {
+  const actual = version.split('.').map((part) => parseInt(part, 10) || 0);
+  const required = minimum.split('.').map((part) => parseInt(part, 10) || 0);
+  for (let i = 0; i < required.length; i++) {
+    const diff = (actual[i] ?? 0) - required[i];
+    if (diff !== 0) {
+      return diff > 0;
+    }
+  }
+  return true;
+}
+
 export interface SetupResult {
   success: boolean;
   error?: string;
@@ -150,7 +168,7 @@ export class KokoroSetupService {
   }
 
   /**
-   * Check if required packages are installed
+   * Check if required packages are installed, with a recent enough kokoro-onnx
    */
   private async packagesInstalled(): Promise<boolean> {
     const pipPath = path.join(this.venvPath, 'bin', 'pip');
@@ -159,8 +177,10 @@ export class KokoroSetupService {
     }
 
     try {
-      const { stdout } = await execAsync(`${pipPath} show kokoro-onnx soundfile 2>/dev/null`);
-      return stdout.includes('Name: kokoro-onnx') && stdout.includes('Name: soundfile');
+      const { stdout } = await execAsync(`${pipPath} show kokoro-onnx soundfile orjson 2>/dev/null`);
+      const kokoroVersion = stdout.match(/Name: kokoro-onnx\s+Version: (\S+)/)?.[1];
+      return !!kokoroVersion && versionAtLeast(kokoroVersion, MIN_KOKORO_ONNX_VERSION)
+        && stdout.includes('Name: soundfile') && stdout.includes('Name: orjson');
     } catch {
       return false;
     }
@@ -176,7 +196,7 @@ export class KokoroSetupService {
     await execAsync(`${pipPath} install --upgrade pip`);
 
     // Install packages
-    const { stderr } = await execAsync(`${pipPath} install kokoro-onnx soundfile`, {
+    const { stderr } = await execAsync(`${pipPath} install --upgrade "kokoro-onnx>=${MIN_KOKORO_ONNX_VERSION}" soundfile orjson`, {
       timeout: 300000, // 5 minutes timeout for package installation
     });
 